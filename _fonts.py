@@ -0,0 +1,24 @@
+"""繪圖共用的中文字體設定：matplotlib 的字體設定為全域，各繪圖函式在建立文字前呼叫 configure_fonts()"""
+
+import functools
+import platform
+
+import matplotlib
+from matplotlib import font_manager
+
+
+@functools.lru_cache(maxsize=1)
+def configure_fonts():
+    """設定中文字體支援 (每個行程只在第一次呼叫時執行一次)"""
+    if platform.system() == 'Darwin':  # macOS
+        matplotlib.rcParams['font.sans-serif'] = ['Arial Unicode MS', 'PingFang HK', 'Heiti TC']
+        matplotlib.rcParams['axes.unicode_minus'] = False
+    elif platform.system() == 'Windows':
+        matplotlib.rcParams['font.sans-serif'] = ['Microsoft YaHei', 'SimHei']
+        matplotlib.rcParams['axes.unicode_minus'] = False
+    else:  # Linux
+        matplotlib.rcParams['font.sans-serif'] = ['WenQuanYi Zen Hei', 'Droid Sans Fallback']
+    matplotlib.rcParams['font.family'] = 'sans-serif'
+
+    # 預先載入字體清單並解析一次字體，之後的繪圖直接使用快取結果
+    font_manager.findfont(font_manager.FontProperties())
@@ -0,0 +1,18 @@
+"""numba 為選用套件：未安裝時 njit 直接回傳原始 Python 函式，prange 即為 range"""
+
+try:
+    from numba import njit, prange
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+    def njit(*args, **kwargs):
+        """不做任何編譯的 njit 替代品，支援 @njit 與 @njit(...) 兩種寫法"""
+        if len(args) == 1 and callable(args[0]) and not kwargs:
+            return args[0]
+
+        def decorator(func):
+            return func
+        return decorator
+
+    prange = range
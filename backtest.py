@@ -3,159 +3,238 @@ import numpy as np
 import matplotlib.pyplot as plt
 from datetime import datetime
 
-def backtest_strategy(df, signal_cols, initial_capital=1000000, position_size=0.2):
+from _fonts import configure_fonts
+from _njit import njit, prange
+
+# 交易類型代碼 (對應 _backtest_loop 回傳的 trade_type)
+TRADE_TYPES = ['買入', '賣出', '結束平倉']
+
+@njit(cache=True)
+def _backtest_loop(signal, close, initial_capital, position_size):
     """
-    對多個交易信號進行回測
+    單一信號的回測核心迴圈 (安裝 numba 時會被編譯)
     
     參數:
-        df (DataFrame): 包含價格和信號的數據框
-        signal_cols (list): 要回測的信號列名列表
+        signal (ndarray): float64 信號序列，>0 買入、<0 賣出
+        close (ndarray): float64 收盤價序列
         initial_capital (float): 初始資金
         position_size (float): 每次交易使用的資本比例 (0-1)
     
     回傳:
-        DataFrame: 回測結果統計
+        tuple: (交易索引, 交易類型代碼, 股數, 成本或所得, 交易後剩餘資金)
     """
-    results = {}
+    n = len(signal)
     
-    for signal_col in signal_cols:
-        # 複製數據避免修改原始數據
-        data = df.copy()
-        
-        # 初始化回測變數
-        capital = initial_capital
-        position = 0
-        trades = []
+    # 只走訪有信號的交易日 (略過第一筆資料)
+    events = np.nonzero(signal[1:])[0] + 1
+    
+    # 每個信號日最多一筆交易，再加上最後的平倉，依此上限預先配置輸出陣列
+    max_trades = len(events) + 1
+    trade_idx = np.empty(max_trades, dtype=np.int64)
+    trade_type = np.empty(max_trades, dtype=np.int8)
+    trade_shares = np.empty(max_trades, dtype=np.int64)
+    trade_cash = np.empty(max_trades, dtype=np.float64)
+    trade_capital = np.empty(max_trades, dtype=np.float64)
+    n_trades = 0
+    
+    capital = initial_capital
+    position = 0
+    
+    for i in events:
+        price = close[i]
         
-        for i in range(1, len(data)):
-            date = data.index[i]
-            signal = data[signal_col].iloc[i]
-            price = data['Close'].iloc[i]
-            
-            # 買入信號
-            if signal > 0 and position == 0:
-                # 計算可買入的股數
-                trade_capital = capital * position_size
-                shares = int(trade_capital / price)
-                
-                if shares > 0:
-                    cost = shares * price
-                    position = shares
-                    capital -= cost
-                    
-                    trades.append({
-                        '日期': date,
-                        '類型': '買入',
-                        '價格': price,
-                        '數量': shares,
-                        '成本': cost,
-                        '剩餘資金': capital
-                    })
+        # 買入信號
+        if signal[i] > 0 and position == 0:
+            # 計算可買入的股數
+            shares = int(capital * position_size / price)
             
-            # 賣出信號
-            elif signal < 0 and position > 0:
-                # 賣出持有的股票
-                proceeds = position * price
-                capital += proceeds
-                
-                trades.append({
-                    '日期': date,
-                    '類型': '賣出',
-                    '價格': price,
-                    '數量': position,
-                    '所得': proceeds,
-                    '剩餘資金': capital
-                })
+            if shares > 0:
+                cost = shares * price
+                position = shares
+                capital -= cost
                 
-                position = 0
+                trade_idx[n_trades] = i
+                trade_type[n_trades] = 0
+                trade_shares[n_trades] = shares
+                trade_cash[n_trades] = cost
+                trade_capital[n_trades] = capital
+                n_trades += 1
         
-        # 如果結束時還有持倉，以最後價格平倉
-        if position > 0:
-            last_price = data['Close'].iloc[-1]
-            proceeds = position * last_price
+        # 賣出信號
+        elif signal[i] < 0 and position > 0:
+            proceeds = position * price
             capital += proceeds
             
-            trades.append({
-                '日期': data.index[-1],
-                '類型': '結束平倉',
-                '價格': last_price,
-                '數量': position,
-                '所得': proceeds,
-                '剩餘資金': capital
-            })
+            trade_idx[n_trades] = i
+            trade_type[n_trades] = 1
+            trade_shares[n_trades] = position
+            trade_cash[n_trades] = proceeds
+            trade_capital[n_trades] = capital
+            n_trades += 1
+            
+            position = 0
+    
+    # 如果結束時還有持倉，以最後價格平倉
+    if position > 0:
+        proceeds = position * close[n - 1]
+        capital += proceeds
         
-        # 計算總收益和其他統計數據
-        total_return = (capital / initial_capital - 1) * 100
-        trades_df = pd.DataFrame(trades)
+        trade_idx[n_trades] = n - 1
+        trade_type[n_trades] = 2
+        trade_shares[n_trades] = position
+        trade_cash[n_trades] = proceeds
+        trade_capital[n_trades] = capital
+        n_trades += 1
+    
+    return (trade_idx[:n_trades], trade_type[:n_trades], trade_shares[:n_trades],
+            trade_cash[:n_trades], trade_capital[:n_trades])
+
+@njit(parallel=True, cache=True)
+def _backtest_all(signals, close, initial_capital, position_size):
+    """
+    以多執行緒同時回測多個信號，每個信號的時間序列仍依序處理
+    
+    參數:
+        signals (ndarray): [K, N] float64 信號矩陣，每列為一個信號
+        close (ndarray): float64 收盤價序列 (所有信號共用)
+        initial_capital (float): 初始資金
+        position_size (float): 每次交易使用的資本比例 (0-1)
+    
+    回傳:
+        tuple: (各信號交易筆數, 交易索引, 交易類型代碼, 股數, 成本或所得, 交易後剩餘資金)
+               後五項為 [K, 最大交易筆數] 陣列，第 k 列只有前 n_trades[k] 筆有效
+    """
+    n_signals = signals.shape[0]
+    
+    # 交易筆數上限：信號日數量最多的信號 + 最後的平倉
+    max_trades = 1
+    for k in range(n_signals):
+        max_trades = max(max_trades, np.count_nonzero(signals[k, 1:]) + 1)
+    
+    n_trades = np.zeros(n_signals, dtype=np.int64)
+    trade_idx = np.zeros((n_signals, max_trades), dtype=np.int64)
+    trade_type = np.zeros((n_signals, max_trades), dtype=np.int8)
+    trade_shares = np.zeros((n_signals, max_trades), dtype=np.int64)
+    trade_cash = np.zeros((n_signals, max_trades), dtype=np.float64)
+    trade_capital = np.zeros((n_signals, max_trades), dtype=np.float64)
+    
+    for k in prange(n_signals):
+        idx, types, shares, cash, capital = _backtest_loop(signals[k], close, initial_capital, position_size)
+        m = len(idx)
+        n_trades[k] = m
+        trade_idx[k, :m] = idx
+        trade_type[k, :m] = types
+        trade_shares[k, :m] = shares
+        trade_cash[k, :m] = cash
+        trade_capital[k, :m] = capital
+    
+    return n_trades, trade_idx, trade_type, trade_shares, trade_cash, trade_capital
+
+def _summarize_backtest(dates, close, trade_idx, trade_type, trade_shares, trade_cash, trade_capital,
+                        initial_capital):
+    """
+    由單一信號的交易陣列建立交易記錄並計算統計數據
+    
+    參數:
+        dates (Index): 交易日期
+        close (ndarray): float64 收盤價序列
+        trade_idx, trade_type, trade_shares, trade_cash, trade_capital (ndarray): _backtest_loop 的輸出
+        initial_capital (float): 初始資金
+    
+    回傳:
+        dict: 回測統計與交易記錄
+    """
+    capital = trade_capital[-1] if len(trade_idx) > 0 else initial_capital
+    
+    # 由回傳的陣列一次建立交易記錄
+    is_buy = trade_type == 0
+    trades_df = pd.DataFrame({
+        '日期': dates[trade_idx],
+        '類型': pd.Categorical.from_codes(trade_type, categories=TRADE_TYPES),
+        '價格': close[trade_idx],
+        '數量': trade_shares,
+        '成本': np.where(is_buy, trade_cash, np.nan),
+        '剩餘資金': trade_capital,
+        '所得': np.where(is_buy, np.nan, trade_cash)
+    }) if len(trade_idx) > 0 else pd.DataFrame()
+    
+    # 計算總收益和其他統計數據
+    total_return = (capital / initial_capital - 1) * 100
+    
+    # 如果有交易，計算交易統計數據
+    if len(trades_df) > 0:
+        # 第 i 筆買入與第 i 筆賣出/平倉配對，以陣列運算計算每筆交易的盈虧
+        buy_pos = np.flatnonzero(is_buy)
+        sell_pos = np.flatnonzero(~is_buy)
+        min_count = min(len(buy_pos), len(sell_pos))
+        buy_pos, sell_pos = buy_pos[:min_count], sell_pos[:min_count]
         
-        # 如果有交易，計算交易統計數據
-        if len(trades) > 0:
-            buy_trades = trades_df[trades_df['類型'] == '買入']
-            sell_trades = trades_df[trades_df['類型'].isin(['賣出', '結束平倉'])]
-            
-            avg_holding_days = 0
-            winning_trades = 0
-            losing_trades = 0
-            total_profit = 0
-            total_loss = 0
-            
-            # 計算每筆交易的盈虧
-            if len(buy_trades) > 0 and len(sell_trades) > 0:
-                buy_count = len(buy_trades)
-                min_count = min(len(buy_trades), len(sell_trades))
-                
-                for i in range(min_count):
-                    buy_price = buy_trades.iloc[i]['價格']
-                    buy_shares = buy_trades.iloc[i]['數量']
-                    sell_price = sell_trades.iloc[i]['價格']
-                    
-                    # 計算交易盈虧
-                    trade_profit = (sell_price - buy_price) * buy_shares
-                    
-                    if trade_profit > 0:
-                        winning_trades += 1
-                        total_profit += trade_profit
-                    else:
-                        losing_trades += 1
-                        total_loss += trade_profit
-                    
-                    # 計算持有時間
-                    if i < min_count:
-                        buy_date = buy_trades.iloc[i]['日期']
-                        sell_date = sell_trades.iloc[i]['日期']
-                        holding_days = (sell_date - buy_date).days
-                        avg_holding_days += holding_days
-                
-                if min_count > 0:
-                    avg_holding_days /= min_count
-            
-            win_rate = winning_trades / len(trades) * 100 if len(trades) > 0 else 0
-            
-            results[signal_col] = {
-                '初始資金': initial_capital,
-                '最終資金': capital,
-                '總收益率(%)': total_return,
-                '交易次數': len(trades) // 2,  # 買入+賣出算一次交易
-                '勝率(%)': win_rate,
-                '平均持倉天數': avg_holding_days,
-                '總盈利': total_profit,
-                '總虧損': total_loss,
-                '盈虧比': abs(total_profit / total_loss) if total_loss != 0 else float('inf'),
-                '交易記錄': trades_df
-            }
-        else:
-            results[signal_col] = {
-                '初始資金': initial_capital,
-                '最終資金': capital,
-                '總收益率(%)': 0,
-                '交易次數': 0,
-                '勝率(%)': 0,
-                '平均持倉天數': 0,
-                '總盈利': 0,
-                '總虧損': 0,
-                '盈虧比': 0,
-                '交易記錄': pd.DataFrame()
-            }
+        prices = close[trade_idx]
+        pnl = (prices[sell_pos] - prices[buy_pos]) * trade_shares[buy_pos]
+        is_win = pnl > 0
+        winning_trades = int(is_win.sum())
+        total_profit = float(np.where(is_win, pnl, 0).sum())
+        total_loss = float(np.where(is_win, 0, pnl).sum())
+        
+        # 計算平均持有時間
+        trade_dates = dates[trade_idx].to_numpy()
+        holding = (trade_dates[sell_pos] - trade_dates[buy_pos]).astype('timedelta64[D]').astype(np.int64)
+        avg_holding_days = holding.mean() if min_count > 0 else 0
+        
+        win_rate = winning_trades / len(trades_df) * 100 if len(trades_df) > 0 else 0
+        
+        return {
+            '初始資金': initial_capital,
+            '最終資金': capital,
+            '總收益率(%)': total_return,
+            '交易次數': len(trades_df) // 2,  # 買入+賣出算一次交易
+            '勝率(%)': win_rate,
+            '平均持倉天數': avg_holding_days,
+            '總盈利': total_profit,
+            '總虧損': total_loss,
+            '盈虧比': abs(total_profit / total_loss) if total_loss != 0 else float('inf'),
+            '交易記錄': trades_df
+        }
+    else:
+        return {
+            '初始資金': initial_capital,
+            '最終資金': capital,
+            '總收益率(%)': 0,
+            '交易次數': 0,
+            '勝率(%)': 0,
+            '平均持倉天數': 0,
+            '總盈利': 0,
+            '總虧損': 0,
+            '盈虧比': 0,
+            '交易記錄': pd.DataFrame()
+        }
+
+def backtest_strategy(df, signal_cols, initial_capital=1000000, position_size=0.2):
+    """
+    對多個交易信號進行回測
+    
+    參數:
+        df (DataFrame): 包含價格和信號的數據框
+        signal_cols (list): 要回測的信號列名列表
+        initial_capital (float): 初始資金
+        position_size (float): 每次交易使用的資本比例 (0-1)
+    
+    回傳:
+        DataFrame: 回測結果統計
+    """
+    # 價格與日期只需取出一次，所有信號共用
+    dates = df.index
+    close = df['Close'].to_numpy(dtype=np.float64)
+    
+    # 各信號排成連續的 [K, N] 矩陣，在同一個程序內以多執行緒平行回測
+    signals = np.ascontiguousarray(df[signal_cols].to_numpy(dtype=np.float64).T)
+    n_trades, *trade_arrays = _backtest_all(signals, close, float(initial_capital), float(position_size))
+    
+    results = {}
+    for k, signal_col in enumerate(signal_cols):
+        m = n_trades[k]
+        results[signal_col] = _summarize_backtest(dates, close, *(arr[k, :m] for arr in trade_arrays),
+                                                  initial_capital)
     
     # 將結果轉換為DataFrame
     results_df = pd.DataFrame({k: {kk: vv for kk, vv in v.items() if kk != '交易記錄'} 
@@ -166,95 +245,108 @@ def backtest_strategy(df, signal_cols, initial_capital=1000000, position_size=0.
     
     return results_df, results
 
-def plot_equity_curve(df, signal_col, trades_df, title=None):
-    """繪製權益曲線和交易點"""
+def plot_equity_curve(df, signal_col, trades_df, title=None, save_path=None, axes=None):
+    """
+    繪製權益曲線和交易點
+    
+    參數:
+        save_path (str): 指定時將圖表存成檔案，不呼叫 plt.show()
+        axes (tuple): 重複使用的 (價格圖, 資金曲線圖) 兩個 Axes，會先清空再繪製
+    """
+    configure_fonts()
+    
     if trades_df.empty:
         print(f"沒有交易記錄可供繪製: {signal_col}")
         return
     
-    plt.figure(figsize=(12, 8))
+    if axes is None:
+        fig, (ax_price, ax_equity) = plt.subplots(2, 1, figsize=(12, 8))
+    else:
+        ax_price, ax_equity = axes
+        ax_price.clear()
+        ax_equity.clear()
+        fig = ax_price.figure
     
-    # 繪製收盤價
-    plt.subplot(2, 1, 1)
-    plt.plot(df.index, df['Close'], label='收盤價', color='blue', alpha=0.6)
+    # 交易日期對應到價格數據的位置 (-1 表示不在價格數據中)
+    trade_dates = trades_df['日期'].to_numpy()
+    trade_pos = df.index.get_indexer(trades_df['日期'])
+    in_index = trade_pos >= 0
+    close_values = df['Close'].to_numpy()
+    close_at_trade = np.where(in_index, close_values[trade_pos], np.nan)
     
-    # 標記買入點和賣出點
-    buy_points = trades_df[trades_df['類型'] == '買入']
-    sell_points = trades_df[trades_df['類型'].isin(['賣出', '結束平倉'])]
+    is_buy = (trades_df['類型'] == '買入').to_numpy()
+    is_sell = trades_df['類型'].isin(['賣出', '結束平倉']).to_numpy()
     
-    for idx, row in buy_points.iterrows():
-        date = row['日期']
-        if date in df.index:
-            plt.scatter(date, df.loc[date, 'Close'], color='green', s=100, marker='^')
+    # 繪製收盤價
+    ax_price.plot(df.index, df['Close'], label='收盤價', color='blue', alpha=0.6)
     
-    for idx, row in sell_points.iterrows():
-        date = row['日期']
-        if date in df.index:
-            plt.scatter(date, df.loc[date, 'Close'], color='red', s=100, marker='v')
+    # 標記買入點和賣出點
+    ax_price.scatter(trade_dates[is_buy & in_index], close_at_trade[is_buy & in_index],
+                     color='green', s=100, marker='^')
+    ax_price.scatter(trade_dates[is_sell & in_index], close_at_trade[is_sell & in_index],
+                     color='red', s=100, marker='v')
     
-    plt.title(title or f'{signal_col} 交易信號回測')
-    plt.ylabel('價格')
-    plt.grid(True, alpha=0.3)
-    plt.legend()
+    ax_price.set_title(title or f'{signal_col} 交易信號回測')
+    ax_price.set_ylabel('價格')
+    ax_price.grid(True, alpha=0.3)
+    ax_price.legend()
     
     # 繪製資金曲線
-    plt.subplot(2, 1, 2)
     
     # 初始資金
     initial_capital = trades_df['剩餘資金'].iloc[0] + trades_df['成本'].iloc[0] \
                       if '成本' in trades_df.columns and len(trades_df) > 0 else 1000000
     
-    # 計算每筆交易後的總資產
-    equity = [initial_capital]
-    dates = [df.index[0]]
+    # 每筆交易的現金變化：買入付出成本、賣出或結束平倉收回所得
+    cost = trades_df['成本'].fillna(0).to_numpy() if '成本' in trades_df.columns else np.zeros(len(trades_df))
+    proceeds = trades_df['所得'].fillna(0).to_numpy() if '所得' in trades_df.columns else np.zeros(len(trades_df))
+    capital = np.cumsum(np.concatenate(([initial_capital], np.where(is_buy, -cost, proceeds))))[1:]
     
-    position = 0
-    capital = initial_capital
+    # 計算每筆交易後的總資產 = 現金 + 持倉價值
+    position = np.where(is_buy, trades_df['數量'].to_numpy(), 0)
+    holding = (position > 0) & in_index
+    trade_equity = capital + np.where(holding, position * np.nan_to_num(close_at_trade), 0)
     
-    for idx, row in trades_df.iterrows():
-        date = row['日期']
-        
-        if row['類型'] == '買入':
-            capital -= row['成本']
-            position = row['數量']
-        else:  # 賣出或結束平倉
-            capital += row['所得']
-            position = 0
-        
-        # 計算總資產 = 現金 + 持倉價值
-        total_equity = capital
-        if position > 0:
-            if date in df.index:
-                total_equity += position * df.loc[date, 'Close']
-        
-        equity.append(total_equity)
-        dates.append(date)
+    equity = [initial_capital] + trade_equity.tolist()
+    dates = [df.index[0]] + list(trades_df['日期'])
     
     # 添加最後一個日期點
     if dates[-1] != df.index[-1]:
         dates.append(df.index[-1])
-        last_equity = capital
-        if position > 0:
-            last_equity += position * df['Close'].iloc[-1]
+        last_equity = capital[-1]
+        if position[-1] > 0:
+            last_equity += position[-1] * close_values[-1]
         equity.append(last_equity)
     
-    plt.plot(dates, equity, color='purple', label='資金曲線')
+    ax_equity.plot(dates, equity, color='purple', label='資金曲線')
     
     # 添加基準比較 (Buy & Hold)
     initial_shares = initial_capital / df['Close'].iloc[0]
     benchmark = df['Close'] * initial_shares
-    plt.plot(df.index, benchmark, color='gray', linestyle='--', alpha=0.7, label='買入持有策略')
+    ax_equity.plot(df.index, benchmark, color='gray', linestyle='--', alpha=0.7, label='買入持有策略')
+    
+    ax_equity.set_xlabel('日期')
+    ax_equity.set_ylabel('資產價值')
+    ax_equity.grid(True, alpha=0.3)
+    ax_equity.legend()
     
-    plt.xlabel('日期')
-    plt.ylabel('資產價值')
-    plt.grid(True, alpha=0.3)
-    plt.legend()
+    fig.tight_layout()
     
-    plt.tight_layout()
-    plt.show()
+    if save_path:
+        fig.savefig(save_path, dpi=100)
+        # 呼叫端傳入的 Axes 留給下一張圖重複使用
+        if axes is None:
+            plt.close(fig)
+    else:
+        plt.show()
 
-def run_backtest(data, top_signals, days=None):
-    """執行回測並顯示結果"""
+def run_backtest(data, top_signals, days=None, save_plots=False):
+    """
+    執行回測並顯示結果
+    
+    save_plots 為 True 時權益曲線存成 equity_curve_<信號>[_<天數>d].png，
+    所有圖共用同一個 Figure，適合非互動式執行
+    """
     print(f"\n開始回測 {len(top_signals)} 個頂級信號...")
     
     # 執行回測
@@ -267,9 +359,18 @@ def run_backtest(data, top_signals, days=None):
     # 對表現最好的前3個信號繪製權益曲線
     top_performers = backtest_results.head(3).index.tolist()
     
+    # 共用的圖表在此建立，字體須先設定好
+    configure_fonts()
+    fig, axes = plt.subplots(2, 1, figsize=(12, 8)) if save_plots else (None, None)
+    
     for signal in top_performers:
         trades_df = detailed_results[signal]['交易記錄']
         title = f"{signal} 交易回測 ({days}天預測)" if days else f"{signal} 交易回測"
-        plot_equity_curve(data, signal, trades_df, title)
+        save_path = (f"equity_curve_{signal}_{days}d.png" if days else f"equity_curve_{signal}.png") \
+                    if save_plots else None
+        plot_equity_curve(data, signal, trades_df, title, save_path=save_path, axes=axes)
+    
+    if fig is not None:
+        plt.close(fig)
     
     return backtest_results, detailed_results
\ No newline at end of file
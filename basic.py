@@ -1,228 +1,426 @@
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
-import seaborn as sns
 import yfinance as yf
 import warnings
 from itertools import combinations
 from matplotlib.colors import LinearSegmentedColormap
+from numpy.lib.stride_tricks import sliding_window_view
+
+from _njit import njit, NUMBA_AVAILABLE
+
+try:
+    import bottleneck as bn
+except ImportError:
+    # bottleneck 為選用套件，未安裝時改用 sliding_window_view
+    bn = None
 
 warnings.filterwarnings('ignore')
 
-# 設定股票代號和時間範圍
-ticker = '5439.TWO'  # 高技
-start_date = '2018-01-01' 
-end_date = '2025-02-28'
-
-print(f"正在下載 {ticker} 的股票數據...")
-stock_data = yf.download(ticker, start=start_date, end=end_date)
-print(f"數據下載完成，共 {len(stock_data)} 筆交易日資料")
-
-# 檢查數據結構
-print("檢查數據結構:")
-print(stock_data.columns)
-
-# 詳細診斷
-print("\n詳細列出所有列名:")
-for col in stock_data.columns:
-    print(f"- {col} (類型: {type(col)})")
-
-# 如果數據有多層索引，簡化它
-if isinstance(stock_data.columns, pd.MultiIndex):
-    # 檢查每個級別
-    for level in range(stock_data.columns.nlevels):
-        print(f"級別 {level}: {stock_data.columns.get_level_values(level).tolist()}")
-    
-    # 使用第0級別的索引 (修改了這裡)
-    stock_data.columns = stock_data.columns.get_level_values(0)
-    print("簡化後的列名:", stock_data.columns)
-
-# 確保必要的列存在
-if 'Close' not in stock_data.columns:
-    if 'Adj Close' in stock_data.columns:
-        print("未找到'Close'列，使用'Adj Close'替代")
-        stock_data['Close'] = stock_data['Adj Close']
-    else:
-        print("錯誤：數據缺少必要的列。重新嘗試下載...")
-        # 重新下載，不使用自動調整
-        stock_data = yf.download(ticker, start=start_date, end=end_date, auto_adjust=False)
-        print("重新下載後的列名:", stock_data.columns)
-        
-        # 再次檢查必要的列
-        if 'Close' not in stock_data.columns:
-            print("錯誤：無法獲取必要的'Close'列，程序終止")
-            exit(1)
+def _append_columns(df, new_cols):
+    """將新欄位一次合併到數據框 (同名欄位以新值取代)，不修改原始數據"""
+    data = df.drop(columns=[col for col in new_cols if col in df.columns])
+    return pd.concat([data, pd.DataFrame(new_cols, index=df.index)], axis=1)
+
 # ============== 1. 計算全部技術指標 ==============
+def _sliding_window(values, window, func, **kwargs):
+    """以 sliding_window_view 計算固定視窗統計量，前 window-1 筆為 NaN"""
+    out = np.full(len(values), np.nan)
+    if len(values) >= window:
+        out[window - 1:] = func(sliding_window_view(values, window), axis=1, **kwargs)
+    return out
+
+def _rolling(values, window, bn_name, func, **kwargs):
+    """
+    移動統計量的共用入口：有 bottleneck 時使用 bn.<bn_name>，否則以 sliding_window_view 計算
+    
+    資料筆數少於 window 時與 rolling(window) 相同回傳全 NaN (bottleneck 在此情況會拋出 ValueError)
+    """
+    if len(values) < window:
+        return np.full(len(values), np.nan)
+    if bn is not None:
+        return getattr(bn, bn_name)(values, window, **kwargs)
+    return _sliding_window(values, window, func, **kwargs)
+
+def _rolling_mean(values, window):
+    """與 rolling(window).mean() 相同的移動平均"""
+    return _rolling(values, window, 'move_mean', np.mean)
+
+def _rolling_std(values, window):
+    """與 rolling(window).std() 相同的移動標準差 (ddof=1)"""
+    return _rolling(values, window, 'move_std', np.std, ddof=1)
+
+def _rolling_min(values, window):
+    """與 rolling(window).min() 相同的移動最小值"""
+    return _rolling(values, window, 'move_min', np.min)
+
+def _rolling_max(values, window):
+    """與 rolling(window).max() 相同的移動最大值"""
+    return _rolling(values, window, 'move_max', np.max)
+
+def _exact_rolling_mean(values, window):
+    """
+    小視窗的移動平均：視窗內數值完全相同時直接回傳該值，與 rolling(window).mean() 一樣精確
+    
+    bottleneck 與累加相減的算法在視窗內數值相同時仍可能有 1e-14 級的誤差，
+    用於 %D 時會讓 K 與 D 恰好相等的日子被誤判為交叉
+    """
+    out = np.full(len(values), np.nan)
+    if len(values) >= window:
+        views = sliding_window_view(values, window)
+        # 視窗含 NaN 時 min/max 為 NaN，比較結果為 False，平均值也是 NaN
+        constant = views.min(axis=1) == views.max(axis=1)
+        out[window - 1:] = np.where(constant, views[:, 0], views.mean(axis=1, dtype=np.float64))
+    return out
+
+# 以下 numba 核心以明確型別簽名在匯入時編譯 (float32 價格與 float64 中間結果各一版)，
+# 搭配 cache=True 之後的執行直接載入編譯快取，第一次呼叫時不需再等待 JIT。
+# 輸入宣告為唯讀陣列，可同時接受一般陣列與 pandas copy-on-write 回傳的唯讀陣列
+_INPUT_ARRAYS = ('Array(float32, 1, "A", readonly=True)', 'Array(float64, 1, "A", readonly=True)')
+
+@njit([f'UniTuple(float64[:], 2)({arr}, int64)' for arr in _INPUT_ARRAYS], cache=True)
+def _rolling_mean_std(values, window):
+    """
+    以 Welford 演算法單次掃描同時算出移動平均與移動標準差 (ddof=1)
+    
+    視窗內的有效值不足 window 筆時為 NaN，與 rolling(window).mean() / .std() 相同；
+    視窗內數值完全相同時與 pandas 一樣精確回傳該值與標準差 0
+    """
+    n = len(values)
+    mean_out = np.full(n, np.nan)
+    std_out = np.full(n, np.nan)
+    
+    count = 0
+    mean = 0.0
+    m2 = 0.0
+    same = 0  # 以 values[i] 結尾、連續相同數值的筆數
+    
+    for i in range(n):
+        # 加入新值
+        x = values[i]
+        if np.isnan(x):
+            same = 0
+        elif i > 0 and x == values[i - 1]:
+            same += 1
+        else:
+            same = 1
+        if not np.isnan(x):
+            count += 1
+            delta = x - mean
+            mean += delta / count
+            m2 += delta * (x - mean)
+        
+        # 移除離開視窗的舊值
+        if i >= window:
+            old = values[i - window]
+            if not np.isnan(old):
+                count -= 1
+                if count == 0:
+                    mean = 0.0
+                    m2 = 0.0
+                else:
+                    delta = old - mean
+                    mean -= delta / count
+                    m2 -= delta * (old - mean)
+        
+        if count == window:
+            if same >= window:
+                # 視窗內全為同一數值：重設累積量，避免增減抵銷後殘留的誤差
+                mean = x
+                m2 = 0.0
+            mean_out[i] = mean
+            std_out[i] = np.sqrt(max(m2, 0.0) / (window - 1))
+    
+    return mean_out, std_out
+
+@njit([f'float64[:]({arr}, float64)' for arr in _INPUT_ARRAYS], cache=True)
+def _ema(values, alpha):
+    """
+    與 ewm(alpha=alpha, adjust=False).mean() 相同的指數移動平均
+    
+    開頭的 NaN 維持 NaN；中途的 NaN 沿用前值，下一筆有效值的權重依間隔衰減
+    """
+    n = len(values)
+    out = np.empty(n)
+    weighted = np.nan
+    old_wt = 1.0
+    
+    for i in range(n):
+        x = values[i]
+        if np.isnan(weighted):
+            if not np.isnan(x):
+                weighted = x
+        else:
+            old_wt *= 1.0 - alpha
+            if not np.isnan(x):
+                weighted = (old_wt * weighted + alpha * x) / (old_wt + alpha)
+                old_wt = 1.0
+        out[i] = weighted
+    
+    return out
+
+@njit([f'float64[:]({arr}, int64)' for arr in _INPUT_ARRAYS], cache=True)
+def _rsi(close, period):
+    """
+    單次掃描計算 RSI：漲幅與跌幅的指數平均在同一個迴圈內更新，不建立中間陣列
+    
+    結果與以 diff / clip / ewm(alpha=1/period, adjust=False) 計算的 RSI 相同
+    """
+    n = len(close)
+    out = np.full(n, np.nan)
+    alpha = 1.0 / period
+    avg_gain = np.nan
+    avg_loss = np.nan
+    old_wt = 1.0
+    
+    for i in range(1, n):
+        delta = close[i] - close[i - 1]
+        
+        # 漲跌幅同時為 NaN 或同時有效，共用同一組權重
+        if np.isnan(avg_gain):
+            if not np.isnan(delta):
+                avg_gain = max(delta, 0.0)
+                avg_loss = max(-delta, 0.0)
+        else:
+            old_wt *= 1.0 - alpha
+            if not np.isnan(delta):
+                avg_gain = (old_wt * avg_gain + alpha * max(delta, 0.0)) / (old_wt + alpha)
+                avg_loss = (old_wt * avg_loss + alpha * max(-delta, 0.0)) / (old_wt + alpha)
+                old_wt = 1.0
+        
+        if not np.isnan(avg_gain):
+            if avg_loss == 0:
+                # 沒有跌幅時 RSI 為 100；完全沒有波動時無法定義
+                out[i] = 100.0 if avg_gain > 0 else np.nan
+            else:
+                out[i] = 100 - (100 / (1 + avg_gain / avg_loss))
+    
+    return out
+
+def _ewm_mean(values, alpha):
+    """與 ewm(alpha=alpha, adjust=False).mean() 相同；有 numba 時使用編譯後的 _ema"""
+    if NUMBA_AVAILABLE:
+        return _ema(values, alpha)
+    return pd.Series(values).ewm(alpha=alpha, adjust=False).mean().to_numpy()
+
+def _calculate_rsi(values, period=14):
+    """計算 RSI；有 numba 時以 _rsi 單次掃描完成"""
+    if NUMBA_AVAILABLE:
+        return _rsi(values, period)
+    
+    delta = pd.Series(values).diff()
+    gain = delta.clip(lower=0)
+    loss = -delta.clip(upper=0)
+    avg_gain = gain.ewm(alpha=1/period, adjust=False).mean()
+    avg_loss = loss.ewm(alpha=1/period, adjust=False).mean()
+    rs = avg_gain / avg_loss
+    rsi = 100 - (100 / (1 + rs))
+    return rsi.to_numpy()
+
+def _price_values(series):
+    """
+    取出計算指標用的 float32 價格陣列，使讀取的記憶體量減半 (整數價格也一併轉換，符合 numba 核心的型別簽名)
+    
+    只轉換計算用的陣列；數據框中的價格欄位維持原型別，回測與報酬率仍以 float64 計算
+    """
+    return series.to_numpy(dtype=np.float32)
+
 def calculate_indicators(df):
     """計算所有常用技術指標"""
-    data = df.copy()
+    # 所有新指標先放進 dict，最後一次合併回原始數據
+    indicators = {}
+    
+    # 價格以 float32 計算指標
+    close = _price_values(df['Close'])
+    high = _price_values(df['High'])
+    low = _price_values(df['Low'])
     
     # --- RSI (相對強弱指數) ---
-    def calculate_rsi(prices, period=14):
-        delta = prices.diff()
-        gain = delta.clip(lower=0)
-        loss = -delta.clip(upper=0)
-        avg_gain = gain.ewm(alpha=1/period, adjust=False).mean()
-        avg_loss = loss.ewm(alpha=1/period, adjust=False).mean()
-        rs = avg_gain / avg_loss
-        rsi = 100 - (100 / (1 + rs))
-        return rsi
-    
-    # 計算不同週期的 RSI
     for period in [9, 14, 25]:
-        data[f'RSI_{period}'] = calculate_rsi(data['Close'], period)
+        indicators[f'RSI_{period}'] = _calculate_rsi(close, period)
     
     # --- MACD (移動平均匯聚背馳指標) ---
-    # 標準 MACD
-    data['EMA_12'] = data['Close'].ewm(span=12, adjust=False).mean()
-    data['EMA_26'] = data['Close'].ewm(span=26, adjust=False).mean()
-    data['MACD'] = data['EMA_12'] - data['EMA_26']
-    data['MACD_Signal'] = data['MACD'].ewm(span=9, adjust=False).mean()
-    data['MACD_Hist'] = data['MACD'] - data['MACD_Signal']
+    # 標準 MACD (span 對應的平滑係數為 2 / (span + 1))
+    ema_12 = _ewm_mean(close, 2 / (12 + 1))
+    ema_26 = _ewm_mean(close, 2 / (26 + 1))
+    macd = ema_12 - ema_26
+    macd_signal = _ewm_mean(macd, 2 / (9 + 1))
+    indicators['EMA_12'] = ema_12
+    indicators['EMA_26'] = ema_26
+    indicators['MACD'] = macd
+    indicators['MACD_Signal'] = macd_signal
+    indicators['MACD_Hist'] = macd - macd_signal
+    
+    # --- 一次算好所有視窗的移動統計量 ---
+    close_mean = {period: _rolling_mean(close, period) for period in [5, 10, 20, 50, 100, 200]}
+    if NUMBA_AVAILABLE:
+        # 布林帶的移動平均與標準差由同一次 Welford 掃描取得
+        bb_stats = {period: _rolling_mean_std(close, period) for period in [20, 40]}
+    else:
+        bb_stats = {period: (close_mean[period] if period in close_mean else _rolling_mean(close, period),
+                             _rolling_std(close, period))
+                    for period in [20, 40]}
+    low_min = {window: _rolling_min(low, window) for window in [5, 9, 14]}
+    high_max = {window: _rolling_max(high, window) for window in [5, 9, 14]}
     
     # --- 移動平均線 (MA) ---
     for period in [5, 10, 20, 50, 100, 200]:
-        data[f'MA_{period}'] = data['Close'].rolling(window=period).mean()
+        indicators[f'MA_{period}'] = close_mean[period]
     
     # --- 布林帶 (Bollinger Bands) ---
     for period in [20, 40]:
+        ma, std = bb_stats[period]
+        
         for std_mult in [1.5, 2, 2.5]:
             bb_col = f'BB_{period}_{std_mult}'
             
-            # 計算中間線、上下軌 (逐步計算避免多列問題)
-            ma = data['Close'].rolling(window=period).mean()
-            std = data['Close'].rolling(window=period).std()
-            
-            data[f'{bb_col}_MA'] = ma
-            data[f'{bb_col}_Upper'] = ma + (std_mult * std)
-            data[f'{bb_col}_Lower'] = ma - (std_mult * std)
+            upper = ma + (std_mult * std)
+            lower = ma - (std_mult * std)
             
-            # 計算 %B 值
-            upper = data[f'{bb_col}_Upper']
-            lower = data[f'{bb_col}_Lower']
-            close = data['Close']
+            indicators[f'{bb_col}_MA'] = ma
+            indicators[f'{bb_col}_Upper'] = upper
+            indicators[f'{bb_col}_Lower'] = lower
             
-            b_percent = (close - lower) / (upper - lower)
-            data[f'{bb_col}_%B'] = b_percent
-            
-            # 處理可能的除零問題
-            data[f'{bb_col}_%B'].fillna(0.5, inplace=True)
-            data.loc[data[f'{bb_col}_%B'] == np.inf, f'{bb_col}_%B'] = 0.5
-            data.loc[data[f'{bb_col}_%B'] == -np.inf, f'{bb_col}_%B'] = 0.5
+            # 計算 %B 值，並處理可能的除零問題
+            with np.errstate(divide='ignore', invalid='ignore'):
+                b_percent = (close - lower) / (upper - lower)
+            indicators[f'{bb_col}_%B'] = np.where(np.isfinite(b_percent), b_percent, 0.5)
     
     # --- KD 隨機指標 ---
     for window in [5, 9, 14]:
+        # 計算 %K，並處理可能的除零或無效值
+        with np.errstate(divide='ignore', invalid='ignore'):
+            k_values = 100 * ((close - low_min[window]) / (high_max[window] - low_min[window]))
+        k_values = np.where(np.isfinite(k_values), k_values, 50)
+        
+        indicators[f'Low_{window}'] = low_min[window]
+        indicators[f'High_{window}'] = high_max[window]
+        indicators[f'%K_{window}'] = k_values
+        
         for d_period in [3, 5]:
-            k_col = f'%K_{window}'
-            d_col = f'%D_{window}_{d_period}'
-            
-            # 計算 K、D 値 (逐步計算避免多列問題)
-            low_min = data['Low'].rolling(window=window).min()
-            high_max = data['High'].rolling(window=window).max()
-            
-            data[f'Low_{window}'] = low_min
-            data[f'High_{window}'] = high_max
-            
-            # 計算 %K
-            k_values = 100 * ((data['Close'] - low_min) / (high_max - low_min))
-            data[k_col] = k_values
-            
-            # 處理可能的除零或無效值
-            data[k_col].fillna(50, inplace=True)
-            data.loc[data[k_col] == np.inf, k_col] = 50
-            data.loc[data[k_col] == -np.inf, k_col] = 50
-            
-            # 計算 %D (K的移動平均)
-            data[d_col] = data[k_col].rolling(window=d_period).mean()
+            # 計算 %D (K的移動平均)，K 值持平時 D 與 K 完全相等，不產生假交叉
+            indicators[f'%D_{window}_{d_period}'] = _exact_rolling_mean(k_values, d_period)
     
     # --- OBV (On-Balance Volume) ---
-    if 'Volume' in data.columns:
+    if 'Volume' in df.columns:
+        volume = df['Volume'].to_numpy()
+        
         # 計算成交量移動平均
         for period in [5, 10, 20, 50]:
-            data[f'Volume_MA_{period}'] = data['Volume'].rolling(window=period).mean()
-        
-        # 安全計算 OBV (確保使用純量值)
-        obv = [0]  # 首筆資料 OBV 為 0
-        for i in range(1, len(data)):
-            current_close = float(data['Close'].iloc[i])
-            prev_close = float(data['Close'].iloc[i-1])
-            current_volume = float(data['Volume'].iloc[i])
-            
-            if current_close > prev_close:
-                obv.append(obv[-1] + current_volume)
-            elif current_close < prev_close:
-                obv.append(obv[-1] - current_volume)
-            else:
-                obv.append(obv[-1])
+            indicators[f'Volume_MA_{period}'] = _rolling_mean(volume, period)
         
-        data['OBV'] = obv
+        # 向量化計算 OBV: 收盤價上漲加上成交量、下跌減去成交量，首筆資料為 0
+        # 成交量為整數時 OBV 也維持 int64，結果精確
+        direction = np.nan_to_num(np.sign(np.diff(close, prepend=close[:1]))).astype(np.int64)
+        indicators['OBV'] = np.cumsum(np.where(direction != 0, direction * volume, 0))
     
-    return data
+    return _append_columns(df, indicators)
 
 # ============== 2. 計算全部交易信號 ==============
+def _shift(values):
+    """與 Series.shift(1) 相同：整體後移一格，第一筆補 NaN"""
+    shifted = np.empty(len(values), dtype=np.float64)
+    shifted[:1] = np.nan
+    shifted[1:] = values[:-1]
+    return shifted
+
+def _crossovers(fast, slow):
+    """
+    以 fast - slow 的差值一次找出上穿與下穿
+    
+    回傳:
+        tuple: (上穿布林陣列, 下穿布林陣列)，前一天為 NaN 時不視為交叉
+    """
+    diff = fast - slow
+    prev_diff = _shift(diff)
+    bullish = (diff > 0) & (prev_diff <= 0)
+    bearish = (diff < 0) & (prev_diff >= 0)
+    return bullish, bearish
+
 def calculate_signals(df):
     """計算各種技術指標的交易信號"""
-    data = df.copy()
+    # 只讀取既有欄位，新信號先放進 dict，最後一次合併
+    signals = {}
     
     # --- KD 隨機指標信號 ---
     for window in [5, 9, 14]:
         for d_period in [3, 5]:
-            k_col = f'%K_{window}'
-            d_col = f'%D_{window}_{d_period}'
-            signal_col = f'KD_{window}_{d_period}_Signal'
-            data[signal_col] = 0
+            k_values = df[f'%K_{window}'].to_numpy(dtype=np.float64)
+            d_values = df[f'%D_{window}_{d_period}'].to_numpy(dtype=np.float64)
             
-            # 買入信號: K線在低檔區(20以下)向上穿越D線
-            data.loc[(data[k_col] < 20) & 
-                     (data[k_col] > data[d_col]) & 
-                     (data[k_col].shift(1) <= data[d_col].shift(1)), 
-                     signal_col] = 1
+            # 黃金交叉 (K上穿D) / 死亡交叉 (K下穿D)
+            bullish_cross, bearish_cross = _crossovers(k_values, d_values)
             
+            # 買入信號: K線在低檔區(20以下)向上穿越D線
             # 賣出信號: K線在高檔區(80以上)向下穿越D線
-            data.loc[(data[k_col] > 80) & 
-                     (data[k_col] < data[d_col]) & 
-                     (data[k_col].shift(1) >= data[d_col].shift(1)), 
-                     signal_col] = -1
+            signals[f'KD_{window}_{d_period}_Signal'] = np.where(
+                bullish_cross & (k_values < 20), 1,
+                np.where(bearish_cross & (k_values > 80), -1, 0))
             
             # 備用信號: 黃金交叉/死亡交叉 (任何區域K線穿越D線)
-            bullish_cross_col = f'KD_{window}_{d_period}_GoldenCross'
-            bearish_cross_col = f'KD_{window}_{d_period}_DeathCross'
-            
-            data[bullish_cross_col] = 0
-            data[bearish_cross_col] = 0
-            
-            # 黃金交叉 (K上穿D)
-            data.loc[(data[k_col] > data[d_col]) & 
-                     (data[k_col].shift(1) <= data[d_col].shift(1)), 
-                     bullish_cross_col] = 1
-            
-            # 死亡交叉 (K下穿D)
-            data.loc[(data[k_col] < data[d_col]) & 
-                     (data[k_col].shift(1) >= data[d_col].shift(1)), 
-                     bearish_cross_col] = -1
+            signals[f'KD_{window}_{d_period}_GoldenCross'] = np.where(bullish_cross, 1, 0)
+            signals[f'KD_{window}_{d_period}_DeathCross'] = np.where(bearish_cross, -1, 0)
     
-    # --- RSI 信號 --- (注意：這部分已從 KD 迴圈移出)
+    # --- RSI 信號 ---
     for period in [9, 14, 25]:
-        signal_col = f'RSI_{period}_Signal'
-        data[signal_col] = 0
+        rsi = df[f'RSI_{period}'].to_numpy(dtype=np.float64)
+        prev_rsi = _shift(rsi)
         
-        # 買入: RSI低於30後回升
-        data.loc[(data[f'RSI_{period}'] < 30) & (data[f'RSI_{period}'].shift(1) < 30) & 
-                 (data[f'RSI_{period}'] > data[f'RSI_{period}'].shift(1)), signal_col] = 1
-        
-        # 賣出: RSI高於70後回落
-        data.loc[(data[f'RSI_{period}'] > 70) & (data[f'RSI_{period}'].shift(1) > 70) & 
-                 (data[f'RSI_{period}'] < data[f'RSI_{period}'].shift(1)), signal_col] = -1
-    
-    # --- MACD 信號 --- (注意：這部分已從 KD 迴圈移出)
-    data['MACD_Signal_Col'] = 0
+        # 買入: RSI低於30後回升；賣出: RSI高於70後回落
+        signals[f'RSI_{period}_Signal'] = np.where(
+            (rsi < 30) & (prev_rsi < 30) & (rsi > prev_rsi), 1,
+            np.where((rsi > 70) & (prev_rsi > 70) & (rsi < prev_rsi), -1, 0))
     
-    # 買入: MACD上穿Signal Line
-    data.loc[(data['MACD'] > data['MACD_Signal']) & 
-             (data['MACD'].shift(1) <= data['MACD_Signal'].shift(1)), 'MACD_Signal_Col'] = 1
+    # --- MACD 信號 ---
+    # 買入: MACD上穿Signal Line；賣出: MACD下穿Signal Line
+    macd_bullish, macd_bearish = _crossovers(df['MACD'].to_numpy(dtype=np.float64),
+                                             df['MACD_Signal'].to_numpy(dtype=np.float64))
+    signals['MACD_Signal_Col'] = np.where(macd_bullish, 1, np.where(macd_bearish, -1, 0))
     
-    # 賣出: MACD下穿Signal Line
-    data.loc[(data['MACD'] < data['MACD_Signal']) & 
-             (data['MACD'].shift(1) >= data['MACD_Signal'].shift(1)), 'MACD_Signal_Col'] = -1
+    return _append_columns(df, signals)
+
+# 直接執行本檔時才下載數據，避免被 main.py 或回測子程序匯入時重複下載
+if __name__ == '__main__':
+    # 設定股票代號和時間範圍
+    ticker = '5439.TWO'  # 高技
+    start_date = '2018-01-01' 
+    end_date = '2025-02-28'
+
+    print(f"正在下載 {ticker} 的股票數據...")
+    stock_data = yf.download(ticker, start=start_date, end=end_date)
+    print(f"數據下載完成，共 {len(stock_data)} 筆交易日資料")
+
+    # 檢查數據結構
+    print("檢查數據結構:")
+    print(stock_data.columns)
+
+    # 詳細診斷
+    print("\n詳細列出所有列名:")
+    for col in stock_data.columns:
+        print(f"- {col} (類型: {type(col)})")
+
+    # 如果數據有多層索引，簡化它
+    if isinstance(stock_data.columns, pd.MultiIndex):
+        # 檢查每個級別
+        for level in range(stock_data.columns.nlevels):
+            print(f"級別 {level}: {stock_data.columns.get_level_values(level).tolist()}")
     
-    return data
\ No newline at end of file
+        # 使用第0級別的索引 (修改了這裡)
+        stock_data.columns = stock_data.columns.get_level_values(0)
+        print("簡化後的列名:", stock_data.columns)
+
+    # 確保必要的列存在
+    if 'Close' not in stock_data.columns:
+        if 'Adj Close' in stock_data.columns:
+            print("未找到'Close'列，使用'Adj Close'替代")
+            stock_data['Close'] = stock_data['Adj Close']
+        else:
+            print("錯誤：數據缺少必要的列。重新嘗試下載...")
+            # 重新下載，不使用自動調整
+            stock_data = yf.download(ticker, start=start_date, end=end_date, auto_adjust=False)
+            print("重新下載後的列名:", stock_data.columns)
+        
+            # 再次檢查必要的列
+            if 'Close' not in stock_data.columns:
+                print("錯誤：無法獲取必要的'Close'列，程序終止")
+                exit(1)
@@ -3,122 +3,164 @@ import numpy as np
 import matplotlib.pyplot as plt
 from matplotlib.colors import LinearSegmentedColormap
 
-def evaluate_individual_signals(df, days_forward=5):
-    """評估各類技術指標的績效表現"""
-    data = df.copy()
+def _future_returns(data, days_forward):
+    """取得n天後的回報率：優先使用呼叫端預先算好的 Return_{n}d 欄位"""
+    col = f'Return_{days_forward}d'
+    if col in data.columns:
+        return data[col]
+    return data['Close'].pct_change(days_forward).shift(-days_forward)
+
+def build_signal_matrix(df, signal_cols=None):
+    """
+    將信號欄位轉成連續的 int8 信號矩陣 (1 買入、-1 賣出、0 無信號)
     
-    # 計算未來n天後的回報率
-    data[f'Return_{days_forward}d'] = data['Close'].pct_change(days_forward).shift(-days_forward)
+    參數:
+        df (DataFrame): 包含信號的數據框
+        signal_cols (list): 信號列名列表，預設為所有信號欄位
     
-    # 儲存各指標績效
-    results = []
+    回傳:
+        tuple: (信號列名列表, [N, K] int8 信號矩陣)
+    """
+    if signal_cols is None:
+        signal_cols = [col for col in df.columns if '_Signal' in col or col.endswith('_Col')]
     
-    # 找出所有信號欄位
-    signal_cols = [col for col in data.columns if '_Signal' in col or col.endswith('_Col')]
+    # 只保留正負號，NaN 視為無信號
+    values = np.nan_to_num(df[signal_cols].to_numpy(dtype=np.float64))
+    return signal_cols, np.sign(values).astype(np.int8)
+
+def evaluate_individual_signals(df, days_forward=5, signal_cols=None, signal_matrix=None):
+    """
+    評估各類技術指標的績效表現
     
-    for signal_col in signal_cols:
-        # 計算信號數量
-        buy_signals = data.loc[data[signal_col] > 0]
-        sell_signals = data.loc[data[signal_col] < 0]
-        
-        buy_count = len(buy_signals)
-        sell_count = len(sell_signals)
-        total_signals = buy_count + sell_count
-        
-        if total_signals == 0:
-            continue  # 跳過沒有交易信號的指標
-        
-        # 計算買入信號準確率 (n天後價格上漲的比例)
-        if buy_count > 0:
-            buy_accuracy = buy_signals[~buy_signals[f'Return_{days_forward}d'].isna()][f'Return_{days_forward}d'] > 0
-            buy_accuracy = buy_accuracy.mean()
-            buy_return = buy_signals[f'Return_{days_forward}d'].mean() * 100  # 轉換為百分比
-        else:
-            buy_accuracy = np.nan
-            buy_return = np.nan
-        
-        # 計算賣出信號準確率 (n天後價格下跌的比例)
-        if sell_count > 0:
-            sell_accuracy = sell_signals[~sell_signals[f'Return_{days_forward}d'].isna()][f'Return_{days_forward}d'] < 0
-            sell_accuracy = sell_accuracy.mean()
-            sell_return = -sell_signals[f'Return_{days_forward}d'].mean() * 100  # 轉換為百分比
-        else:
-            sell_accuracy = np.nan
-            sell_return = np.nan
+    可傳入 build_signal_matrix 預先建立的信號矩陣，多個天期共用時不必重複轉換；
+    此時必須同時傳入對應的 signal_cols
+    """
+    # 所有信號疊成 [N, K] 陣列，一次對所有指標做統計
+    if signal_matrix is None:
+        signal_cols, signal_matrix = build_signal_matrix(df, signal_cols)
+    elif signal_cols is None:
+        raise ValueError("傳入 signal_matrix 時必須同時傳入 signal_cols (build_signal_matrix 回傳的信號列名列表)")
+    elif len(signal_cols) != signal_matrix.shape[1]:
+        raise ValueError(f"signal_cols 有 {len(signal_cols)} 個欄位，但 signal_matrix 有 {signal_matrix.shape[1]} 欄")
+    signals = signal_matrix
+    future_returns = _future_returns(df, days_forward).to_numpy(dtype=np.float64)
+    
+    valid = ~np.isnan(future_returns)
+    
+    # 每個交易日的 [是否有信號, 有回報率, 上漲, 下跌, 回報率]
+    daily_stats = np.column_stack([
+        np.ones(len(future_returns)),
+        valid,
+        future_returns > 0,
+        future_returns < 0,
+        np.where(valid, future_returns, 0.0)
+    ])
+    
+    # 買入與賣出遮罩並排成 [N, 2K]，一次矩陣乘法得到所有信號的加總
+    masks = np.concatenate([signals > 0, signals < 0], axis=1).astype(np.float64)
+    totals = masks.T @ daily_stats
+    buy_totals, sell_totals = totals[:signals.shape[1]], totals[signals.shape[1]:]
+    
+    # 信號數量 (含無法計算未來回報率的信號)、有回報率的數量、預測正確的數量、回報率加總
+    buy_count = buy_totals[:, 0].astype(np.int64)
+    sell_count = sell_totals[:, 0].astype(np.int64)
+    total_signals = buy_count + sell_count
+    buy_valid, sell_valid = buy_totals[:, 1], sell_totals[:, 1]
+    buy_hits, sell_hits = buy_totals[:, 2], sell_totals[:, 3]
+    buy_return_sum, sell_return_sum = buy_totals[:, 4], sell_totals[:, 4]
+    
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # 買入信號準確率 (n天後價格上漲的比例) 與平均回報率 (百分比)
+        buy_accuracy = np.where(buy_count > 0, buy_hits / buy_valid, np.nan)
+        buy_return = np.where(buy_count > 0, buy_return_sum / buy_valid * 100, np.nan)
         
-        # 計算總準確率
-        if buy_count > 0 and sell_count > 0:
-            total_accuracy = (buy_signals[~buy_signals[f'Return_{days_forward}d'].isna()][f'Return_{days_forward}d'] > 0).sum() + \
-                             (sell_signals[~sell_signals[f'Return_{days_forward}d'].isna()][f'Return_{days_forward}d'] < 0).sum()
-            total_accuracy_denom = (~buy_signals[f'Return_{days_forward}d'].isna()).sum() + (~sell_signals[f'Return_{days_forward}d'].isna()).sum()
-            total_accuracy = total_accuracy / total_accuracy_denom if total_accuracy_denom > 0 else np.nan
-        elif buy_count > 0:
-            total_accuracy = buy_accuracy
-        elif sell_count > 0:
-            total_accuracy = sell_accuracy
-        else:
-            total_accuracy = np.nan
+        # 賣出信號準確率 (n天後價格下跌的比例) 與平均回報率 (百分比)
+        sell_accuracy = np.where(sell_count > 0, sell_hits / sell_valid, np.nan)
+        sell_return = np.where(sell_count > 0, -sell_return_sum / sell_valid * 100, np.nan)
         
-        # 保存結果
-        results.append({
-            'Signal': signal_col,
-            'Buy_Signals': buy_count,
-            'Sell_Signals': sell_count,
-            'Total_Signals': total_signals,
-            'Buy_Accuracy': buy_accuracy,
-            'Sell_Accuracy': sell_accuracy,
-            'Total_Accuracy': total_accuracy,
-            'Buy_Return': buy_return,
-            'Sell_Return': sell_return
-        })
+        # 總準確率：只有單邊信號時沿用該邊的準確率
+        total_accuracy = np.where(
+            (buy_count > 0) & (sell_count > 0),
+            (buy_hits + sell_hits) / (buy_valid + sell_valid),
+            np.where(buy_count > 0, buy_accuracy, sell_accuracy))
+    
+    results_df = pd.DataFrame({
+        'Buy_Signals': buy_count,
+        'Sell_Signals': sell_count,
+        'Total_Signals': total_signals,
+        'Buy_Accuracy': buy_accuracy,
+        'Sell_Accuracy': sell_accuracy,
+        'Total_Accuracy': total_accuracy,
+        'Buy_Return': buy_return,
+        'Sell_Return': sell_return
+    }, index=pd.Index(signal_cols, name='Signal'))
     
-    # 轉換為DataFrame
-    results_df = pd.DataFrame(results).set_index('Signal')
-    return results_df
+    # 跳過沒有交易信號的指標
+    return results_df[total_signals > 0]
+
+def _pack_bits(mask):
+    """將 [N, K] 布林陣列沿時間軸打包成 [K, ceil(N/64)] 的 uint64 位元陣列 (每個 uint64 含 64 個交易日)"""
+    packed = np.packbits(mask.T, axis=1, bitorder='little')
+    packed = np.pad(packed, ((0, 0), (0, -packed.shape[1] % 8)))
+    return np.ascontiguousarray(packed).view(np.uint64)
+
+def _popcount(bits):
+    """計算位元陣列中 1 的個數"""
+    if hasattr(np, 'bitwise_count'):  # numpy >= 2.0
+        return int(np.bitwise_count(bits).sum())
+    return int(np.unpackbits(bits.view(np.uint8)).sum())
+
+def _unpack_bits(bits, n):
+    """將 uint64 位元陣列還原成長度為 n 的布林陣列"""
+    return np.unpackbits(bits.view(np.uint8), count=n, bitorder='little').view(bool)
 
 def analyze_signal_combinations(data, indicators, days_forward=5):
     """分析多個指標信號共同出現時的表現"""
     from itertools import combinations
     
-    df = data.copy()
     results = {}
     
-    # 計算未來回報率
-    if f'Return_{days_forward}d' not in df.columns:
-        df[f'Return_{days_forward}d'] = df['Close'].pct_change(days_forward).shift(-days_forward)
+    # 取得未來回報率 (不修改傳入的數據)
+    future_returns = _future_returns(data, days_forward).to_numpy(dtype=np.float64)
+    n = len(future_returns)
+    valid = ~np.isnan(future_returns)
+    filled_returns = np.where(valid, future_returns, 0.0)
+    
+    # 買入/賣出信號與回報率條件都打包成位元，組合的交集只需對 uint64 做 AND
+    signals = data[list(indicators)].to_numpy(dtype=np.float64)
+    buy_bits = _pack_bits(signals > 0)
+    sell_bits = _pack_bits(signals < 0)
+    valid_bits, up_bits, down_bits = _pack_bits(
+        np.column_stack([valid, future_returns > 0, future_returns < 0]))
     
     # 分析多種指標組合
     for i in range(2, min(len(indicators) + 1, 4)):  # 最多分析到3個指標的組合
-        for combo in list(combinations(indicators, i)):
+        for combo_idx in combinations(range(len(indicators)), i):
+            combo = tuple(indicators[k] for k in combo_idx)
             combo_name = " + ".join(combo)
             
-            # 找出所有指標同時發出買入信號的日期
-            buy_mask = df[combo[0]] > 0  # 初始掩碼
-            for ind in combo[1:]:
-                buy_mask = buy_mask & (df[ind] > 0)
-            
-            # 找出所有指標同時發出賣出信號的日期
-            sell_mask = df[combo[0]] < 0  # 初始掩碼
-            for ind in combo[1:]:
-                sell_mask = sell_mask & (df[ind] < 0)
-            
-            # 計算績效
-            buy_signals = df[buy_mask]
-            sell_signals = df[sell_mask]
+            # 找出所有指標同時發出買入/賣出信號的日期
+            buy_combined = np.bitwise_and.reduce(buy_bits[list(combo_idx)], axis=0)
+            sell_combined = np.bitwise_and.reduce(sell_bits[list(combo_idx)], axis=0)
             
-            buy_count = len(buy_signals)
-            sell_count = len(sell_signals)
+            buy_count = _popcount(buy_combined)
+            sell_count = _popcount(sell_combined)
             
+            # 計算績效 (未來回報率為 NaN 的信號計入準確率分母，不計入平均回報率)
             if buy_count > 0:
-                buy_accuracy = (buy_signals[f'Return_{days_forward}d'] > 0).mean()
-                buy_return = buy_signals[f'Return_{days_forward}d'].mean() * 100
+                buy_accuracy = _popcount(buy_combined & up_bits) / buy_count
+                buy_valid = _popcount(buy_combined & valid_bits)
+                buy_return_sum = filled_returns[_unpack_bits(buy_combined, n)].sum()
+                buy_return = buy_return_sum / buy_valid * 100 if buy_valid > 0 else float('nan')
             else:
                 buy_accuracy = float('nan')
                 buy_return = float('nan')
             
             if sell_count > 0:
-                sell_accuracy = (sell_signals[f'Return_{days_forward}d'] < 0).mean()
-                sell_return = -sell_signals[f'Return_{days_forward}d'].mean() * 100
+                sell_accuracy = _popcount(sell_combined & down_bits) / sell_count
+                sell_valid = _popcount(sell_combined & valid_bits)
+                sell_return_sum = filled_returns[_unpack_bits(sell_combined, n)].sum()
+                sell_return = -sell_return_sum / sell_valid * 100 if sell_valid > 0 else float('nan')
             else:
                 sell_accuracy = float('nan')
                 sell_return = float('nan')
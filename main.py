@@ -1,3 +1,5 @@
+import matplotlib
+matplotlib.use('Agg')  # 非互動式後端：須在其他模組匯入 pyplot 之前設定
 from backtest import run_backtest
 import pandas as pd
 import numpy as np
@@ -8,7 +10,7 @@ from datetime import datetime
 
 # 引入自定義模組
 from basic import calculate_indicators, calculate_signals
-from evaluation import evaluate_individual_signals, analyze_signal_combinations
+from evaluation import evaluate_individual_signals, analyze_signal_combinations, build_signal_matrix
 from visualization import visualize_signal_performance
 
 # 關閉警告
@@ -46,10 +48,18 @@ def main():
     # 設定評估參數
     evaluation_periods = [5, 10, 20]  # 天數
     
+    # 各天期的未來回報率只計算一次，供評估與組合分析共用
+    for days in evaluation_periods:
+        data_with_signals[f'Return_{days}d'] = data_with_signals['Close'].pct_change(days).shift(-days)
+    
+    # 信號欄位轉為 int8 矩陣一次，供各天期評估共用
+    signal_cols, signal_matrix = build_signal_matrix(data_with_signals)
+    
     # 評估個別指標的績效
     for days in evaluation_periods:
         print(f"\n評估 {days} 天後的指標表現...")
-        results = evaluate_individual_signals(data_with_signals, days_forward=days)
+        results = evaluate_individual_signals(data_with_signals, days_forward=days,
+                                              signal_cols=signal_cols, signal_matrix=signal_matrix)
         
         # 顯示表現最好的指標
         top_results = results.sort_values('Buy_Accuracy', ascending=False)
@@ -82,7 +92,8 @@ def main():
         print("\n對表現最好的信號進行回測...")
         backtest_top_n = 10  # 回測前10個信號
         signals_to_backtest = top_results.head(backtest_top_n).index.tolist()
-        backtest_results, detailed_results = run_backtest(data_with_signals, signals_to_backtest, days)
+        backtest_results, detailed_results = run_backtest(data_with_signals, signals_to_backtest, days,
+                                                          save_plots=True)
         # 在 main.py 末尾添加這段代碼
         def check_current_signals(data, top_signals):
             """檢查當前最新的交易信號"""
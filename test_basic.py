@@ -0,0 +1,162 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import basic
+
+
+def _make_prices(n, seed=0):
+    """產生 n 筆模擬的 OHLCV 日線數據"""
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, n)))
+    return pd.DataFrame({
+        'Open': close * (1 + rng.normal(0, 0.005, n)),
+        'High': close * (1 + rng.uniform(0, 0.02, n)),
+        'Low': close * (1 - rng.uniform(0, 0.02, n)),
+        'Close': close,
+        'Volume': rng.integers(100_000, 5_000_000, n),
+    }, index=pd.bdate_range('2024-01-01', periods=n))
+
+
+def _bottleneck_backends():
+    """有安裝 bottleneck 時兩種路徑都測試，否則只測 sliding_window_view 版本"""
+    backends = [pytest.param(None, id='numpy')]
+    try:
+        import bottleneck
+        backends.append(pytest.param(bottleneck, id='bottleneck'))
+    except ImportError:
+        backends.append(pytest.param(None, id='bottleneck', marks=pytest.mark.skip('未安裝 bottleneck')))
+    return backends
+
+
+@pytest.fixture(params=_bottleneck_backends())
+def rolling_backend(request, monkeypatch):
+    monkeypatch.setattr(basic, 'bn', request.param)
+
+
+@pytest.mark.parametrize('window', [2, 5, 149, 150, 151, 200])
+def test_rolling_helpers_match_pandas_for_short_series(rolling_backend, window):
+    values = _make_prices(150)['Close'].to_numpy()
+    series = pd.Series(values)
+    rolling = series.rolling(window)
+
+    np.testing.assert_allclose(basic._rolling_mean(values, window), rolling.mean(), equal_nan=True)
+    np.testing.assert_allclose(basic._rolling_std(values, window), rolling.std(), equal_nan=True)
+    np.testing.assert_allclose(basic._rolling_min(values, window), rolling.min(), equal_nan=True)
+    np.testing.assert_allclose(basic._rolling_max(values, window), rolling.max(), equal_nan=True)
+
+
+def test_indicators_on_series_shorter_than_longest_window(rolling_backend):
+    df = _make_prices(150)
+
+    result = basic.calculate_signals(basic.calculate_indicators(df))
+
+    # 視窗比資料長的指標全為 NaN，與 rolling(window) 相同
+    assert result['MA_200'].isna().all()
+    assert result['Volume_MA_50'].notna().sum() == 150 - 50 + 1
+    np.testing.assert_allclose(result['MA_20'], df['Close'].rolling(20).mean(), rtol=1e-5, equal_nan=True)
+    np.testing.assert_allclose(result['%D_14_3'], result['%K_14'].rolling(3).mean(), rtol=1e-5, equal_nan=True)
+
+
+def test_exact_rolling_mean_matches_pandas():
+    values = _kernel_input()
+
+    for window in [3, 5]:
+        expected = pd.Series(values).rolling(window).mean()
+        result = basic._exact_rolling_mean(values, window)
+
+        np.testing.assert_allclose(result, expected, rtol=1e-12, equal_nan=True)
+        # 價格不變的視窗精確等於該價格
+        assert (result[149 + window - 1:190] == values[149 + window - 1:190]).all()
+
+
+def test_flat_kd_has_no_false_crosses(rolling_backend):
+    # 價格持平時 %K 固定，%D 必須與 %K 完全相等，不能因誤差產生交叉
+    df = _make_prices(300)
+    df.iloc[150:200] = df.iloc[150].to_numpy()
+
+    result = basic.calculate_signals(basic.calculate_indicators(df))
+
+    for window in [5, 9, 14]:
+        for d_period in [3, 5]:
+            flat = slice(150 + window + d_period, 200)
+            np.testing.assert_array_equal(result[f'%D_{window}_{d_period}'].iloc[flat],
+                                          result[f'%K_{window}'].iloc[flat])
+            for cross in ['GoldenCross', 'DeathCross']:
+                assert not result[f'KD_{window}_{d_period}_{cross}'].iloc[flat].any()
+
+
+def test_indicators_accept_integer_prices():
+    # numba 核心只編譯了 float32/float64 的簽名，整數價格須先轉換
+    pytest.importorskip('numba')
+    df = _make_prices(300)
+    int_df = df.astype({col: 'int64' for col in ['Open', 'High', 'Low', 'Close']})
+
+    result = basic.calculate_indicators(int_df)
+    expected = basic.calculate_indicators(int_df.astype({col: 'float64' for col in ['Open', 'High', 'Low', 'Close']}))
+
+    pd.testing.assert_frame_equal(result.drop(columns=int_df.columns), expected.drop(columns=int_df.columns))
+
+
+def test_indicators_keep_float64_prices_in_frame():
+    # 指標以 float32 計算，但回測與報酬率使用的價格欄位不能被降精度
+    df = (np.round(_make_prices(200), 1)).astype({'Volume': 'int64'})
+
+    result = basic.calculate_indicators(df)
+
+    for col in ['Open', 'High', 'Low', 'Close']:
+        assert result[col].dtype == np.float64
+        pd.testing.assert_series_equal(result[col], df[col])
+
+
+def _kernel_input(n=300, seed=1):
+    """含開頭 NaN、中段缺值與一段價格完全不變的收盤價，用來檢查 numba 核心處理邊界的方式"""
+    values = _make_prices(n, seed)['Close'].to_numpy()
+    values[:7] = np.nan
+    values[7:15] = values[7] + np.arange(8)  # 開頭只漲不跌：RSI 的跌幅平均為 0
+    values[60:63] = np.nan
+    values[120] = np.nan
+    values[150:190] = values[149]
+    return values
+
+
+@pytest.mark.parametrize('window', [5, 20, 40])
+def test_rolling_mean_std_kernel_matches_pandas(window):
+    pytest.importorskip('numba')
+    values = _kernel_input()
+    rolling = pd.Series(values).rolling(window)
+
+    mean, std = basic._rolling_mean_std(values, window)
+
+    np.testing.assert_allclose(mean, rolling.mean(), rtol=1e-10, atol=1e-10, equal_nan=True)
+    np.testing.assert_allclose(std, rolling.std(), rtol=1e-10, atol=1e-10, equal_nan=True)
+    # 價格不變的視窗與 pandas 一樣精確：平均值等於該價格、標準差為 0
+    flat = slice(149 + window - 1, 190)
+    assert (mean[flat] == values[flat]).all()
+    assert (std[flat] == 0).all()
+
+
+@pytest.mark.parametrize('alpha', [2 / 13, 2 / 27, 0.5])
+def test_ema_kernel_matches_pandas_ewm(alpha):
+    pytest.importorskip('numba')
+    values = _kernel_input()
+
+    expected = pd.Series(values).ewm(alpha=alpha, adjust=False).mean()
+
+    np.testing.assert_allclose(basic._ema(values, alpha), expected, rtol=1e-12, equal_nan=True)
+
+
+@pytest.mark.parametrize('period', [9, 14, 25])
+def test_rsi_kernel_matches_pandas(period):
+    pytest.importorskip('numba')
+    values = _kernel_input()
+    delta = pd.Series(values).diff()
+    avg_gain = delta.clip(lower=0).ewm(alpha=1 / period, adjust=False).mean()
+    avg_loss = (-delta.clip(upper=0)).ewm(alpha=1 / period, adjust=False).mean()
+    expected = 100 - (100 / (1 + avg_gain / avg_loss))
+
+    result = basic._rsi(values, period)
+
+    np.testing.assert_allclose(result, expected, rtol=1e-10, equal_nan=True)
+    # 開頭只漲不跌時 RSI 為 100
+    assert (result[8:15] == 100).all()
